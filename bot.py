@@ -39,11 +39,15 @@ COMMANDS_TEXT = (
     "/start        — 🤖 Список команд\n"
     "/help         — 🤖 Список команд\n"
     "/game         — 👤 Начать сбор участников (админ)\n"
-    "/game_start   — 🎮 Запустить турнир (админ)\n"
+    "/game_start   — 🎮 Запустить турнир, /game_start <id> (админ)\n"
+    "/game_cancel  — 🚫 Отменить турнир, /game_cancel <id> (админ)\n"
     "/dice         — 🎲 Бросок кубика во время хода\n"
     "/exchange     — 💱 Обменять очки (только пороговые суммы)\n"
     "/points       — 📊 Мои очки\n"
     "/leaderboard  — 🏆 Рейтинг топ-10\n"
+    "/stats        — 📈 Статистика матчей, /stats @ник\n"
+    "/season       — 📅 Прошлые сезоны, /season <N> — итоги сезона\n"
+    "/season_close — 🔒 Закрыть текущий сезон, /season_close <N> (админ)\n"
     "/id           — 🆔 Показать ID чата\n"
 )
 
@@ -59,10 +63,14 @@ async def set_commands(app):
         BotCommand("help",        "Список команд"),
         BotCommand("game",        "Начать сбор (админ)"),
         BotCommand("game_start",  "Запустить турнир (админ)"),
+        BotCommand("game_cancel", "Отменить турнир (админ)"),
         BotCommand("dice",        "Бросок кубика"),
         BotCommand("exchange",    "Обменять очки"),
         BotCommand("points",      "Мои очки"),
         BotCommand("leaderboard", "Рейтинг топ-10"),
+        BotCommand("stats",       "Статистика матчей"),
+        BotCommand("season",      "Итоги прошлых сезонов"),
+        BotCommand("season_close", "Закрыть сезон (админ)"),
         BotCommand("id",          "Показать ID чата"),
     ])
     logger.info("Bot commands set.")
@@ -84,6 +92,19 @@ def resolve_chat_id(chat, args) -> int | None:
         return cid if is_allowed_chat(cid) else None
     return next(iter(ALLOWED_CHATS)) if len(ALLOWED_CHATS) == 1 else None
 
+def split_chat_args(chat, args):
+    """Split args into (chat_args, rest).
+    In private chats a leading allowed chat_id is taken as the target chat,
+    as in `/points <chat_id>`.
+    """
+    if chat.type == "private" and args:
+        try:
+            if is_allowed_chat(int(args[0])):
+                return args[:1], args[1:]
+        except ValueError:
+            pass
+    return [], list(args)
+
 # ─── Обработчики команд ──────────────────────────────────
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.effective_chat.send_message(COMMANDS_TEXT)
@@ -128,19 +149,27 @@ async def game(update: Update, context: ContextTypes.DEFAULT_TYPE):
     member = await context.bot.get_chat_member(chat.id, update.effective_user.id)
     if member.status not in ("administrator", "creator"):
         return await update.message.reply_text("⚠️ Только админ может начать сбор.")
-    tournament.begin_signup(chat.id)
-    kb = InlineKeyboardMarkup([[InlineKeyboardButton("Участвую", callback_data="join_game")]])
-    await chat.send_message("🔔 Нажмите «Участвую» для регистрации", reply_markup=kb)
+    try:
+        tid = tournament.begin_signup(chat.id)
+    except ValueError as e:
+        return await update.message.reply_text(str(e))
+    kb = InlineKeyboardMarkup([[InlineKeyboardButton("Участвую", callback_data=f"join_game_{tid}")]])
+    await chat.send_message(f"🔔 Турнир #{tid}: нажмите «Участвую» для регистрации", reply_markup=kb)
 
 async def join_game_cb(update: Update, context: ContextTypes.DEFAULT_TYPE):
     q = update.callback_query
-    await q.answer()
     cid = q.message.chat.id
     if not is_allowed_chat(cid):
-        return
-    if tournament.add_player(cid, q.from_user):
-        lst = tournament.list_players(cid)
-        await q.edit_message_text(f"Участвуют: {lst}", reply_markup=q.message.reply_markup)
+        return await q.answer()
+    tid = int(q.data.rsplit("_", 1)[1])
+    if tournament.add_player(cid, tid, q.from_user):
+        await q.answer()
+        lst = tournament.list_players(cid, tid)
+        return await q.edit_message_text(f"Турнир #{tid}. Участвуют: {lst}", reply_markup=q.message.reply_markup)
+    other = tournament.tournament_of(cid, q.from_user.username or q.from_user.full_name)
+    if other is not None and other != tid:
+        return await q.answer(f"❗ Вы уже участвуете в турнире #{other}.", show_alert=True)
+    await q.answer()
 
 async def game_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     chat = update.effective_chat
@@ -150,7 +179,12 @@ async def game_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if member.status not in ("administrator", "creator"):
         return await update.message.reply_text("⚠️ Только админ может запустить турнир.")
     try:
-        byes, pairs_list, first_msg, kb = tournament.start_tournament(chat.id)
+        tid = int(context.args[0].lstrip("#")) if context.args else None
+    except ValueError:
+        return await update.message.reply_text("❗ Номер турнира должен быть числом.")
+    try:
+        tid = tournament.find_signup(chat.id, tid)
+        byes, pairs_list, first_msg, kb = tournament.start_tournament(chat.id, tid)
     except ValueError as e:
         return await update.message.reply_text(str(e))
     for bye in byes:
@@ -159,6 +193,23 @@ async def game_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await context.bot.pin_chat_message(chat.id, m.message_id)
     await context.bot.send_message(chat.id, first_msg, reply_markup=kb)
 
+async def game_cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    chat = update.effective_chat
+    if chat.type != "private" and not is_allowed_chat(chat.id):
+        return await update.message.reply_text("❌ Бот в этом чате не активен.")
+    member = await context.bot.get_chat_member(chat.id, update.effective_user.id)
+    if member.status not in ("administrator", "creator"):
+        return await update.message.reply_text("⚠️ Только админ может отменить турнир.")
+    try:
+        tid = int(context.args[0].lstrip("#")) if context.args else None
+    except ValueError:
+        return await update.message.reply_text("❗ Номер турнира должен быть числом.")
+    try:
+        tid = tournament.cancel_tournament(chat.id, tid)
+    except ValueError as e:
+        return await update.message.reply_text(str(e))
+    await chat.send_message(f"🚫 Турнир #{tid} отменён.")
+
 async def ready_cb(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await tournament.confirm_ready(update, context)
 
@@ -239,6 +290,76 @@ async def leaderboard_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
         text += f"{i}. {user}: {pts} очков\n"
     await update.effective_chat.send_message(text)
 
+# ─── Статистика матчей ───────────────────────────────────
+async def stats_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    chat = update.effective_chat
+    chat_args, args = split_chat_args(chat, context.args)
+    chat_id = resolve_chat_id(chat, chat_args)
+    if chat_id is None:
+        return await chat.send_message("❗ Укажите ID чата: /stats <chat_id> @ник")
+    if args:
+        uname = " ".join(args).lstrip("@")
+    else:
+        uname = update.effective_user.username or update.effective_user.full_name
+    await chat.send_message(tournament.stats_text(chat_id, uname))
+
+# ─── Сезоны ──────────────────────────────────────────────
+async def season_close(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    chat = update.effective_chat
+    if chat.type == "private":
+        return await update.message.reply_text("❗ Команда работает только в групповом чате.")
+    if not is_allowed_chat(chat.id):
+        return await update.message.reply_text("❌ Бот в этом чате не активен.")
+    member = await context.bot.get_chat_member(chat.id, update.effective_user.id)
+    if member.status not in ("administrator", "creator"):
+        return await update.message.reply_text("⚠️ Только админ может закрыть сезон.")
+    current = tournament.current_season(chat.id)
+    if not context.args:
+        return await update.message.reply_text(
+            f"⚠️ Закрытие сезона {current} перенесёт в архив очки всех игроков, "
+            f"включая не обменянные, и обнулит их.\n"
+            f"Для подтверждения: /season_close {current}"
+        )
+    try:
+        season = int(context.args[0])
+    except ValueError:
+        return await update.message.reply_text("❗ Номер сезона должен быть числом.")
+    try:
+        season, moved = tournament.close_season(chat.id, season)
+    except ValueError as e:
+        return await update.message.reply_text(f"❗ {e}")
+    await chat.send_message(
+        f"🔒 Сезон {season} закрыт, итоги {moved} игроков сохранены в архиве.\n"
+        f"Начался сезон {season + 1}: очки обнулены. Итоги: /season {season}"
+    )
+
+async def season_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    chat = update.effective_chat
+    chat_args, args = split_chat_args(chat, context.args)
+    chat_id = resolve_chat_id(chat, chat_args)
+    if chat_id is None:
+        return await chat.send_message("❗ Укажите ID чата: /season <chat_id> <N>")
+    if not args:
+        seasons = tournament.list_seasons(chat_id)
+        current = tournament.current_season(chat_id)
+        if not seasons:
+            return await chat.send_message(f"📅 Идёт сезон {current}, закрытых сезонов нет.")
+        lst = ", ".join(str(s) for s, _ in seasons)
+        return await chat.send_message(
+            f"📅 Идёт сезон {current}. Прошлые сезоны: {lst}\nИтоги: /season <N>"
+        )
+    try:
+        season = int(args[0])
+    except ValueError:
+        return await chat.send_message("❗ Номер сезона должен быть числом.")
+    top = tournament.get_season_leaderboard(chat_id, season, 10)
+    if not top:
+        return await chat.send_message(f"Нет данных за сезон {season}.")
+    text = f"🏆 Топ-10 сезона {season}:\n"
+    for i, (user, pts) in enumerate(top, start=1):
+        text += f"{i}. {user}: {pts} очков\n"
+    await chat.send_message(text)
+
 # ─── Обработчик ошибок ───────────────────────────────────
 async def error_handler(update: object, context: ContextTypes.DEFAULT_TYPE):
     logger.error("Exception while handling update:", exc_info=context.error)
@@ -267,14 +388,18 @@ def main():
     app.add_handler(CommandHandler("help",        help_command))
     app.add_handler(CommandHandler("id",          show_id))
     app.add_handler(CommandHandler("game",        game))
-    app.add_handler(CallbackQueryHandler(join_game_cb, pattern="^join_game$"))
+    app.add_handler(CallbackQueryHandler(join_game_cb, pattern=r"^join_game_\d+$"))
     app.add_handler(CommandHandler("game_start",  game_start))
-    app.add_handler(CallbackQueryHandler(ready_cb,    pattern="^ready_"))
+    app.add_handler(CommandHandler("game_cancel", game_cancel))
+    app.add_handler(CallbackQueryHandler(ready_cb,    pattern=r"^ready_\d+_\d+$"))
     app.add_handler(CommandHandler("dice",        dice))
     app.add_handler(CommandHandler("exchange",    exchange))
     app.add_handler(CallbackQueryHandler(exchange_cb, pattern="^exchange_\d+_\d+$"))
     app.add_handler(CommandHandler("points",      points_cmd))
     app.add_handler(CommandHandler("leaderboard", leaderboard_cmd))
+    app.add_handler(CommandHandler("stats",       stats_cmd))
+    app.add_handler(CommandHandler("season",      season_cmd))
+    app.add_handler(CommandHandler("season_close", season_close))
 
     logger.info("Bot started")
     app.run_polling()
@@ -1,6 +1,7 @@
 import sqlite3
 import random
 import time
+import json
 import logging
 
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
@@ -12,8 +13,12 @@ class TournamentManager:
     FIRST_POINTS  = 0
     SECOND_POINTS = 25
     THIRD_POINTS  = 15
+    PARTICIPATION_POINTS = 0  # каждому участнику турнира
     READY_TIMEOUT = 60  # секунды на готовность
     ROLL_TIMEOUT  = 60  # секунды на ход
+    MAX_TOURNAMENTS = 5  # одновременных турниров в одном чате
+    MATCH_BATCH_SIZE = 32  # матчей в буфере до записи в БД
+    STAT_FIELDS = ("matches", "wins", "titles", "walkovers", "no_shows", "roll_sum", "roll_count")
 
     def __init__(self, job_queue, allowed_chats=None, db_path="scores.db", owner_ids=None):
         self.job_queue     = job_queue
@@ -21,7 +26,14 @@ class TournamentManager:
         self.owner_ids     = list(owner_ids or [])
         self.conn          = sqlite3.connect(db_path, check_same_thread=False)
         self._init_db()
+        # chat_id -> {tournament_id -> состояние турнира}
         self.chats         = {}
+        # (chat_id, username) -> tournament_id, для быстрого поиска матча игрока
+        self.player_index  = {}
+        self.next_tid      = {}
+        # сыгранные матчи и титулы, ещё не записанные в БД
+        self.pending_matches = []
+        self.pending_titles  = []
 
     # ─── ВСПОМОГАТЕЛЬНОЕ ───────────────────────────────────
     @staticmethod
@@ -40,32 +52,183 @@ class TournamentManager:
                 PRIMARY KEY(chat_id, username)
             )
         """)
+        # выплаченные турниры — защита от повторного начисления призов
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS payouts(
+                chat_id       INTEGER NOT NULL,
+                tournament_id INTEGER NOT NULL,
+                paid_at       INTEGER NOT NULL,
+                PRIMARY KEY(chat_id, tournament_id)
+            )
+        """)
+        # закрытые сезоны и их итоговые очки; в scores остаётся только текущий сезон
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS seasons(
+                chat_id   INTEGER NOT NULL,
+                season    INTEGER NOT NULL,
+                closed_at INTEGER NOT NULL,
+                PRIMARY KEY(chat_id, season)
+            )
+        """)
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS scores_archive(
+                chat_id  INTEGER NOT NULL,
+                season   INTEGER NOT NULL,
+                username TEXT NOT NULL,
+                points   INTEGER NOT NULL,
+                PRIMARY KEY(chat_id, season, username)
+            )
+        """)
+        # история матчей и агрегаты по ней, обновляемые при записи
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS matches(
+                id            INTEGER PRIMARY KEY AUTOINCREMENT,
+                chat_id       INTEGER NOT NULL,
+                tournament_id INTEGER NOT NULL,
+                player_a      TEXT NOT NULL,
+                player_b      TEXT NOT NULL,
+                winner        TEXT,
+                rolls         TEXT NOT NULL,
+                duration      INTEGER NOT NULL,
+                forfeit       TEXT,
+                finished_at   INTEGER NOT NULL
+            )
+        """)
+        cur.execute(
+            "CREATE INDEX IF NOT EXISTS matches_chat_tournament ON matches(chat_id, tournament_id)"
+        )
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS player_stats(
+                chat_id    INTEGER NOT NULL,
+                username   TEXT NOT NULL,
+                matches    INTEGER NOT NULL DEFAULT 0,
+                wins       INTEGER NOT NULL DEFAULT 0,
+                titles     INTEGER NOT NULL DEFAULT 0,
+                walkovers  INTEGER NOT NULL DEFAULT 0,
+                no_shows   INTEGER NOT NULL DEFAULT 0,
+                roll_sum   INTEGER NOT NULL DEFAULT 0,
+                roll_count INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY(chat_id, username)
+            )
+        """)
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS head_to_head(
+                chat_id  INTEGER NOT NULL,
+                username TEXT NOT NULL,
+                opponent TEXT NOT NULL,
+                wins     INTEGER NOT NULL DEFAULT 0,
+                losses   INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY(chat_id, username, opponent)
+            )
+        """)
         self.conn.commit()
 
     def _format_username(self, name: str) -> str:
         return name if name.startswith("@") else f"@{name}"
 
-    # ─── Работа с очками ───────────────────────────────────
-    def _add_points(self, chat_id: int, username: str, pts: int):
-        cur = self.conn.cursor()
-        cur.execute(
-            "SELECT points FROM scores WHERE chat_id=? AND username=?",
-            (chat_id, username),
-        )
-        row = cur.fetchone()
-        new = (row[0] + pts) if row else pts
-        if row:
+    # ─── Турниры чата ──────────────────────────────────────
+    def _get(self, chat_id: int, tid: int):
+        return self.chats.get(chat_id, {}).get(tid)
+
+    def _release_players(self, chat_id: int, tid: int, keep=()):
+        """Убирает игроков турнира tid из индекса, кроме перечисленных в keep."""
+        for name in self.players_of(chat_id, tid):
+            if name not in keep and self.player_index.get((chat_id, name)) == tid:
+                del self.player_index[(chat_id, name)]
+
+    def _finish(self, chat_id: int, tid: int):
+        self._release_players(chat_id, tid)
+        self._flush_matches()
+        tournaments = self.chats.get(chat_id, {})
+        tournaments.pop(tid, None)
+        if not tournaments:
+            self.chats.pop(chat_id, None)
+
+    def _next_tournament_id(self, chat_id: int) -> int:
+        """Номера турниров продолжаются после рестарта, чтобы не совпасть с уже записанными."""
+        if chat_id not in self.next_tid:
+            cur = self.conn.cursor()
             cur.execute(
-                "UPDATE scores SET points=? WHERE chat_id=? AND username=?",
-                (new, chat_id, username),
+                "SELECT MAX(tid) FROM ("
+                "SELECT MAX(tournament_id) AS tid FROM payouts WHERE chat_id=? "
+                "UNION ALL SELECT MAX(tournament_id) FROM matches WHERE chat_id=?)",
+                (chat_id, chat_id),
             )
-        else:
+            self.next_tid[chat_id] = (cur.fetchone()[0] or 0) + 1
+        tid = self.next_tid[chat_id]
+        self.next_tid[chat_id] = tid + 1
+        return tid
+
+    def players_of(self, chat_id: int, tid: int):
+        data = self._get(chat_id, tid) or {}
+        return list(data.get("all_players", []))
+
+    def tournament_of(self, chat_id: int, username: str):
+        """id активного турнира, в котором состоит игрок, или None."""
+        return self.player_index.get((chat_id, username))
+
+    def cancel_tournament(self, chat_id: int, tid: int | None = None) -> int:
+        """Отменяет турнир (сбор или идущий): снимает таймеры, освобождает слот и игроков.
+
+        Без tid отменяет единственный турнир в стадии сбора.
+        """
+        if tid is None:
+            tid = self.find_signup(chat_id)
+        data = self._get(chat_id, tid)
+        if not data:
+            raise ValueError(f"Турнир #{tid} не найден.")
+        for job in [*data["pair_timers"].values(), *data["ready_jobs"].values()]:
+            job.schedule_removal()
+        self._finish(chat_id, tid)
+        return tid
+
+    def find_signup(self, chat_id: int, tid: int | None = None) -> int:
+        """Возвращает id турнира в стадии сбора; без tid — единственный такой."""
+        tournaments = self.chats.get(chat_id, {})
+        if tid is not None:
+            data = tournaments.get(tid)
+            if not data or data["stage"] != "signup":
+                raise ValueError(f"Турнир #{tid} не найден или уже запущен.")
+            return tid
+        signups = [t for t, d in tournaments.items() if d["stage"] == "signup"]
+        if not signups:
+            raise ValueError("Нет турниров в стадии сбора. Используйте /game.")
+        if len(signups) > 1:
+            ids = ", ".join(f"#{t}" for t in signups)
+            raise ValueError(f"Идёт сбор в нескольких турнирах ({ids}). Укажите номер турнира.")
+        return signups[0]
+
+    # ─── Работа с очками ───────────────────────────────────
+    def _payout(self, chat_id: int, tid: int, champ, runner, thirds, players) -> dict:
+        """Начисляет призовые и очки за участие одной транзакцией.
+
+        Повторный вызов для того же турнира ничего не начисляет и возвращает {}.
+        """
+        prizes = {name: self.PARTICIPATION_POINTS for name in players}
+        placements = [(champ, self.FIRST_POINTS), (runner, self.SECOND_POINTS)]
+        placements += [(name, self.THIRD_POINTS) for name in thirds]
+        for name, pts in placements:
+            if name:
+                prizes[name] = prizes.get(name, 0) + pts
+        prizes = {name: pts for name, pts in prizes.items() if pts > 0}
+
+        with self.conn:
+            cur = self.conn.cursor()
             cur.execute(
-                "INSERT INTO scores(chat_id, username, points) VALUES(?,?,?)",
-                (chat_id, username, pts),
+                "INSERT INTO payouts(chat_id, tournament_id, paid_at) VALUES(?,?,?) "
+                "ON CONFLICT(chat_id, tournament_id) DO NOTHING",
+                (chat_id, tid, int(time.time())),
             )
-        self.conn.commit()
-        logger.info(f"Добавлено {pts} очков игроку @{username}. Всего: {new}")
+            if cur.rowcount == 0:
+                logger.warning(f"Призы турнира #{tid} в чате {chat_id} уже выплачены.")
+                return {}
+            cur.executemany(
+                "INSERT INTO scores(chat_id, username, points) VALUES(?,?,?) "
+                "ON CONFLICT(chat_id, username) DO UPDATE SET points = points + excluded.points",
+                [(chat_id, name, pts) for name, pts in prizes.items()],
+            )
+        logger.info(f"Турнир #{tid}: начислено {prizes}")
+        return prizes
 
     def get_points(self, chat_id: int, username: str) -> int:
         cur = self.conn.cursor()
@@ -97,39 +260,217 @@ class TournamentManager:
         cur = self.conn.cursor()
         cur.execute("SELECT username,points FROM scores WHERE chat_id=? ORDER BY points DESC, username LIMIT ?", (chat_id, limit))
         return cur.fetchall()
+
+    # ─── История матчей и статистика ───────────────────────
+    def _record_match(self, chat_id: int, tid: int, idx: int, winner, forfeit=None):
+        """Ставит сыгранный матч в буфер; в БД он попадёт пачкой."""
+        data = self._get(chat_id, tid)
+        a, b = data["pairs"][idx]
+        now = time.time()
+        started = data["first_ready_time"].get(idx, now)
+        self.pending_matches.append({
+            "chat_id": chat_id, "tid": tid, "a": a, "b": b, "winner": winner,
+            "rolls": data["match_rolls"].pop(idx, []),
+            "duration": int(now - started), "forfeit": forfeit,
+            "finished_at": int(now),
+        })
+        if len(self.pending_matches) >= self.MATCH_BATCH_SIZE:
+            self._flush_matches()
+
+    def _flush_matches(self):
+        """Записывает буфер матчей и обновляет агрегаты одной транзакцией."""
+        if not self.pending_matches and not self.pending_titles:
+            return
+        matches, self.pending_matches = self.pending_matches, []
+        titles, self.pending_titles = self.pending_titles, []
+
+        # (chat_id, username) -> {поле STAT_FIELDS: прирост}
+        stats = {}
+        # (chat_id, username, opponent) -> [wins, losses]
+        h2h = {}
+
+        def row(chat_id, name):
+            return stats.setdefault((chat_id, name), dict.fromkeys(self.STAT_FIELDS, 0))
+
+        for m in matches:
+            for me, opp, side in ((m["a"], m["b"], 0), (m["b"], m["a"], 1)):
+                r = row(m["chat_id"], me)
+                # техническое поражение и неявка — не сыгранный матч, считаем отдельно
+                if m["forfeit"] == "no_show" or (m["forfeit"] == "not_ready" and m["winner"] != me):
+                    r["no_shows"] += 1
+                    continue
+                if m["forfeit"] == "not_ready":
+                    r["walkovers"] += 1
+                    continue
+                r["matches"] += 1
+                r["roll_sum"] += sum(roll[side] for roll in m["rolls"])
+                r["roll_count"] += len(m["rolls"])
+                if m["winner"] and not m["forfeit"]:
+                    rec = h2h.setdefault((m["chat_id"], me, opp), [0, 0])
+                    if m["winner"] == me:
+                        r["wins"] += 1
+                        rec[0] += 1
+                    else:
+                        rec[1] += 1
+        for chat_id, name in titles:
+            row(chat_id, name)["titles"] += 1
+
+        fields = ", ".join(self.STAT_FIELDS)
+        updates = ", ".join(f"{f} = {f} + excluded.{f}" for f in self.STAT_FIELDS)
+        with self.conn:
+            cur = self.conn.cursor()
+            cur.executemany(
+                "INSERT INTO matches(chat_id, tournament_id, player_a, player_b, winner, "
+                "rolls, duration, forfeit, finished_at) VALUES(?,?,?,?,?,?,?,?,?)",
+                [(m["chat_id"], m["tid"], m["a"], m["b"], m["winner"],
+                  json.dumps(m["rolls"]), m["duration"], m["forfeit"], m["finished_at"])
+                 for m in matches],
+            )
+            cur.executemany(
+                f"INSERT INTO player_stats(chat_id, username, {fields}) "
+                f"VALUES(?,?{',?' * len(self.STAT_FIELDS)}) "
+                f"ON CONFLICT(chat_id, username) DO UPDATE SET {updates}",
+                [(*key, *r.values()) for key, r in stats.items()],
+            )
+            cur.executemany(
+                "INSERT INTO head_to_head(chat_id, username, opponent, wins, losses) "
+                "VALUES(?,?,?,?,?) ON CONFLICT(chat_id, username, opponent) DO UPDATE SET "
+                "wins = wins + excluded.wins, losses = losses + excluded.losses",
+                [(*key, *row) for key, row in h2h.items()],
+            )
+        logger.info(f"Записано матчей: {len(matches)}, титулов: {len(titles)}")
+
+    def get_player_stats(self, chat_id: int, username: str):
+        """Возвращает словарь полей STAT_FIELDS и avg_roll или None."""
+        cur = self.conn.cursor()
+        cur.execute(
+            f"SELECT {', '.join(self.STAT_FIELDS)} FROM player_stats "
+            "WHERE chat_id=? AND username=?",
+            (chat_id, username),
+        )
+        row = cur.fetchone()
+        if not row:
+            return None
+        stats = dict(zip(self.STAT_FIELDS, row))
+        stats["avg_roll"] = stats["roll_sum"] / stats["roll_count"] if stats["roll_count"] else 0.0
+        return stats
+
+    def get_head_to_head(self, chat_id: int, username: str, limit: int = 5):
+        cur = self.conn.cursor()
+        cur.execute(
+            "SELECT opponent, wins, losses FROM head_to_head WHERE chat_id=? AND username=? "
+            "ORDER BY wins + losses DESC, opponent LIMIT ?",
+            (chat_id, username, limit),
+        )
+        return cur.fetchall()
+
+    def stats_text(self, chat_id: int, username: str) -> str:
+        who = self._format_username(username)
+        stats = self.get_player_stats(chat_id, username)
+        if not stats:
+            return f"📈 У {who} ещё нет сыгранных матчей."
+        matches, wins = stats["matches"], stats["wins"]
+        rate = wins * 100 // matches if matches else 0
+        text = (
+            f"📈 Статистика {who}:\n"
+            f"Матчей: {matches}, побед: {wins} ({rate}%)\n"
+            f"Титулов: {stats['titles']}\n"
+            f"Средний бросок: {stats['avg_roll']:.2f}\n"
+        )
+        if stats["walkovers"]:
+            text += f"Побед без игры (соперник не явился): {stats['walkovers']}\n"
+        if stats["no_shows"]:
+            text += f"Неявок: {stats['no_shows']}\n"
+        h2h = self.get_head_to_head(chat_id, username)
+        if h2h:
+            text += "Личные встречи:\n"
+            for opp, w, l in h2h:
+                text += f"  vs {self._format_username(opp)}: {w}–{l}\n"
+        return text
+
+    # ─── Сезоны ────────────────────────────────────────────
+    def current_season(self, chat_id: int) -> int:
+        cur = self.conn.cursor()
+        cur.execute("SELECT MAX(season) FROM seasons WHERE chat_id=?", (chat_id,))
+        return (cur.fetchone()[0] or 0) + 1
+
+    def close_season(self, chat_id: int, season: int):
+        """Переносит очки чата в архив и начинает новый сезон.
+
+        season — номер текущего сезона как подтверждение; при несовпадении ValueError.
+        Возвращает (номер закрытого сезона, число перенесённых игроков).
+        """
+        with self.conn:
+            cur = self.conn.cursor()
+            current = self.current_season(chat_id)
+            if season != current:
+                raise ValueError(f"Сейчас идёт сезон {current}, а не {season}.")
+            cur.execute(
+                "INSERT INTO scores_archive(chat_id, season, username, points) "
+                "SELECT chat_id, ?, username, points FROM scores WHERE chat_id=?",
+                (season, chat_id),
+            )
+            moved = cur.rowcount
+            cur.execute("DELETE FROM scores WHERE chat_id=?", (chat_id,))
+            cur.execute(
+                "INSERT INTO seasons(chat_id, season, closed_at) VALUES(?,?,?)",
+                (chat_id, season, int(time.time())),
+            )
+        logger.info(f"Сезон {season} в чате {chat_id} закрыт, в архиве {moved} игроков.")
+        return season, moved
+
+    def list_seasons(self, chat_id: int):
+        cur = self.conn.cursor()
+        cur.execute("SELECT season, closed_at FROM seasons WHERE chat_id=? ORDER BY season", (chat_id,))
+        return cur.fetchall()
+
+    def get_season_leaderboard(self, chat_id: int, season: int, limit: int = 10):
+        cur = self.conn.cursor()
+        cur.execute(
+            "SELECT username,points FROM scores_archive WHERE chat_id=? AND season=? "
+            "ORDER BY points DESC, username LIMIT ?",
+            (chat_id, season, limit),
+        )
+        return cur.fetchall()
+
     # ─── Signup ────────────────────────────────────────────
-    def begin_signup(self, chat_id: int):
-        # --- защита от повторного /game_start --------------------------- ◀ NEW
-        current = self.chats.get(chat_id)
-        if current and current.get("stage") in ("signup", "round"):
-            raise ValueError("Турнир уже запущен или идёт сбор игроков.")
-        # -----------------------------------------------------------------
-        self.chats[chat_id] = {
-            "players": [], "stage": "signup",
+    def begin_signup(self, chat_id: int) -> int:
+        tournaments = self.chats.setdefault(chat_id, {})
+        if len(tournaments) >= self.MAX_TOURNAMENTS:
+            raise ValueError(
+                f"В чате уже идёт {len(tournaments)} турниров — это максимум."
+            )
+        tid = self._next_tournament_id(chat_id)
+        tournaments[tid] = {
+            "players": [], "all_players": [], "stage": "signup",
             "next_round": [], "pairs": [], "current_pair_idx": 0,
             "round_pairs_count": 0, "ready": {}, "first_ready_time": {},
             "pair_timers": {}, "roll_timers": {}, "round_wins": {},
             "round_rolls": {}, "turn_order": {}, "finished_pairs": set(),
-            "semifinal_losers": [], "ready_jobs": {},
+            "semifinal_losers": [], "ready_jobs": {}, "match_rolls": {},
         }
+        return tid
 
-    def add_player(self, chat_id: int, user) -> bool:
-        data = self.chats.get(chat_id)
+    def add_player(self, chat_id: int, tid: int, user) -> bool:
+        data = self._get(chat_id, tid)
         if not data or data["stage"] != "signup":
             return False
         name = user.username or user.full_name
-        if name in data["players"]:
+        # игрок может состоять только в одном активном турнире чата
+        if (chat_id, name) in self.player_index:
             return False
         data["players"].append(name)
+        data["all_players"].append(name)
+        self.player_index[(chat_id, name)] = tid
         return True
 
-    def list_players(self, chat_id: int) -> str:
-        data = self.chats.get(chat_id, {})
+    def list_players(self, chat_id: int, tid: int) -> str:
+        data = self._get(chat_id, tid) or {}
         return ", ".join(self._format_username(n) for n in data.get("players", []))
 
     # ─── Старт турнира ─────────────────────────────────────
-    def start_tournament(self, chat_id: int):
-        data = self.chats.get(chat_id)
+    def start_tournament(self, chat_id: int, tid: int):
+        data = self._get(chat_id, tid)
         players = data and data["players"][:]
 
         if not players or len(players) < 2:
@@ -139,6 +480,8 @@ class TournamentManager:
 
         random.shuffle(players)
         data["next_round"].clear()
+        # выбывшие освобождаются и могут записаться в другой турнир
+        self._release_players(chat_id, tid, keep=players)
 
         # (bye-логика осталась на случай дальнейших модификаций)
         byes = []
@@ -156,7 +499,7 @@ class TournamentManager:
             "pair_timers": {}, "roll_timers": {},
             "round_wins": {}, "round_rolls": {},
             "turn_order": {}, "finished_pairs": set(),
-            "semifinal_losers": [], "ready_jobs": {},
+            "ready_jobs": {}, "match_rolls": {},
         })
 
         # запускаем таймер готовности для первой пары
@@ -165,21 +508,21 @@ class TournamentManager:
                 self._pair_timeout,
                 when=self.READY_TIMEOUT,
                 chat_id=chat_id,
-                data={"idx": 0},
-                name=f"pair_timeout_{chat_id}_0"
+                data={"tid": tid, "idx": 0},
+                name=f"pair_timeout_{chat_id}_{tid}_0"
             )
             data["pair_timers"][0] = job
 
-        pairs_list = "\n".join(
+        pairs_list = f"Турнир #{tid}\n" + "\n".join(
             f"Пара {i+1}: {self._format_username(a)} vs {self._format_username(b)}"
             for i, (a, b) in enumerate(pairs)
         )
         first_pair = pairs[0]
         first_msg = (
-            f"Пара 1: {self._format_username(first_pair[0])} vs "
+            f"[#{tid}] Пара 1: {self._format_username(first_pair[0])} vs "
             f"{self._format_username(first_pair[1])}\nНажмите «Готов?»"
         )
-        kb = InlineKeyboardMarkup([[InlineKeyboardButton("Готов?", callback_data="ready_0")]])
+        kb = InlineKeyboardMarkup([[InlineKeyboardButton("Готов?", callback_data=f"ready_{tid}_0")]])
 
         return byes, pairs_list, first_msg, kb
 
@@ -190,9 +533,11 @@ class TournamentManager:
         await q.answer()
 
         chat_id = q.message.chat.id
-        idx = int(q.data.split("_")[1])
+        tid, idx = map(int, q.data.split("_")[1:3])
         name = q.from_user.username or q.from_user.full_name
-        data = self.chats[chat_id]
+        data = self._get(chat_id, tid)
+        if not data or data["stage"] != "round":
+            return
         pair = data["pairs"][idx]
 
         if name not in pair:
@@ -212,8 +557,8 @@ class TournamentManager:
                     self._ready_timeout,
                     when=60,
                     chat_id=chat_id,
-                    data={"idx": idx},
-                    name=f"ready_timeout_{chat_id}_{idx}"
+                    data={"tid": tid, "idx": idx},
+                    name=f"ready_timeout_{chat_id}_{tid}_{idx}"
                 )
                 data["ready_jobs"][idx] = job
             await context.bot.send_message(
@@ -222,7 +567,7 @@ class TournamentManager:
             )
             # сброс общего таймера пары на 60 сек
             if self.job_queue:
-                self._reset_pair_timer(chat_id, idx, 60)
+                self._reset_pair_timer(chat_id, tid, idx, 60)
 
         else:
             first_ts = data["first_ready_time"].get(idx, 0)
@@ -234,6 +579,8 @@ class TournamentManager:
                 data["round_wins"][idx] = {a: 0, b: 0}
                 first, second = random.sample(pair, 2)
                 data["turn_order"][idx] = (first, second)
+                # дальше таймер пары следит только за паузами между бросками
+                self._reset_pair_timer(chat_id, tid, idx, self.ROLL_TIMEOUT)
                 await context.bot.send_message(
                     chat_id,
                     f"🎲 Оба готовы! {self._format_username(first)} ходит первым. Используйте /dice"
@@ -243,8 +590,15 @@ class TournamentManager:
     async def _ready_timeout(self, context: CallbackContext):
         job = context.job
         chat_id = job.chat_id
-        idx = job.data["idx"]
-        data = self.chats[chat_id]
+        tid, idx = job.data["tid"], job.data["idx"]
+        data = self._get(chat_id, tid)
+        if not data:
+            return
+        # сработавшую задачу снимать уже не нужно
+        if data["ready_jobs"].get(idx) is job:
+            del data["ready_jobs"][idx]
+        if idx in data["finished_pairs"]:
+            return
         confirmed = data["ready"].get(idx, [])
         pair = data["pairs"][idx]
 
@@ -256,6 +610,7 @@ class TournamentManager:
             loser = pair[0] if pair[1] == winner else pair[1]
             data["next_round"].append(winner)
             data["finished_pairs"].add(idx)
+            self._record_match(chat_id, tid, idx, winner, forfeit="not_ready")
             await context.bot.send_message(
                 chat_id,
                 f"⏰ Время вышло! ✅ {self._format_username(winner)} прошёл дальше, "
@@ -263,16 +618,17 @@ class TournamentManager:
             )
         else:
             a, b = pair
+            self._record_match(chat_id, tid, idx, None, forfeit="no_show")
             await context.bot.send_message(
                 chat_id,
                 f"⏰ Никто не подтвердил готовность — оба выбывают: "
                 f"{self._format_username(a)}, {self._format_username(b)}."
             )
-        await self._proceed_next(chat_id, context.bot)
+        await self._proceed_next(chat_id, tid, context.bot)
 
     # ───────── сброс таймера пары ─────────
-    def _reset_pair_timer(self, chat_id: int, idx: int, when: int):
-        data = self.chats[chat_id]
+    def _reset_pair_timer(self, chat_id: int, tid: int, idx: int, when: int):
+        data = self._get(chat_id, tid)
         old = data["pair_timers"].pop(idx, None)
         if old:
             old.schedule_removal()
@@ -281,8 +637,8 @@ class TournamentManager:
                 self._pair_timeout,
                 when=when,
                 chat_id=chat_id,
-                data={"idx": idx},
-                name=f"pair_timeout_{chat_id}_{idx}"
+                data={"tid": tid, "idx": idx},
+                name=f"pair_timeout_{chat_id}_{tid}_{idx}"
             )
             data["pair_timers"][idx] = job
 
@@ -290,29 +646,45 @@ class TournamentManager:
     async def _pair_timeout(self, context: CallbackContext):
         job = context.job
         chat_id = job.chat_id
-        idx = job.data["idx"]
-        data = self.chats[chat_id]
+        tid, idx = job.data["tid"], job.data["idx"]
+        data = self._get(chat_id, tid)
+        if not data:
+            return
+        if data["pair_timers"].get(idx) is job:
+            del data["pair_timers"][idx]
 
         if idx in data["finished_pairs"]:
             return
 
         pair = data["pairs"][idx]
         confirmed = data["ready"].get(idx, [])
+        a, b = pair
 
+        if len(confirmed) == 1:
+            # одного подтвердившего проводит дальше _ready_timeout
+            return
         if not confirmed:
-            a, b = pair
             await context.bot.send_message(
                 chat_id,
                 f"⏰ Пара {self._format_username(a)} vs {self._format_username(b)} "
                 "не подтвердила готовность за 120 сек. Оба выбывают."
             )
             data["finished_pairs"].add(idx)
+            self._record_match(chat_id, tid, idx, None, forfeit="no_show")
+        else:
+            await context.bot.send_message(
+                chat_id,
+                f"⏰ Матч {self._format_username(a)} vs {self._format_username(b)} "
+                f"остановился: {self.ROLL_TIMEOUT} сек без бросков. Оба выбывают."
+            )
+            data["finished_pairs"].add(idx)
+            self._record_match(chat_id, tid, idx, None, forfeit="timeout")
 
-        await self._proceed_next(chat_id, context.bot)
+        await self._proceed_next(chat_id, tid, context.bot)
 
     # ───────── переход к следующему шагу ─────────
-    async def _proceed_next(self, chat_id: int, bot):
-        data = self.chats[chat_id]
+    async def _proceed_next(self, chat_id: int, tid: int, bot):
+        data = self._get(chat_id, tid)
         data["current_pair_idx"] += 1
         idx = data["current_pair_idx"]
         pairs = data["pairs"]
@@ -320,11 +692,11 @@ class TournamentManager:
         if idx < len(pairs):
             a, b = pairs[idx]
             kb = InlineKeyboardMarkup(
-                [[InlineKeyboardButton("Готов?", callback_data=f"ready_{idx}")]]
+                [[InlineKeyboardButton("Готов?", callback_data=f"ready_{tid}_{idx}")]]
             )
             await bot.send_message(
                 chat_id,
-                (f"Следующая пара {idx+1}: {self._format_username(a)} vs "
+                (f"[#{tid}] Следующая пара {idx+1}: {self._format_username(a)} vs "
                  f"{self._format_username(b)}\nНажмите «Готов?»"),
                 reply_markup=kb
             )
@@ -334,9 +706,9 @@ class TournamentManager:
         if not winners:
             await bot.send_message(
                 chat_id,
-                "⚠️ Никто не проявил активность. Турнир завершён без победителя."
+                f"⚠️ Никто не проявил активность. Турнир #{tid} завершён без победителя."
             )
-            self.chats.pop(chat_id, None)
+            self._finish(chat_id, tid)
             return
 
         if data["round_pairs_count"] == 2:
@@ -348,7 +720,7 @@ class TournamentManager:
 
         if len(winners) > 1:
             data["players"] = winners.copy()
-            byes, pairs_list, first_msg, kb = self.start_tournament(chat_id)
+            byes, pairs_list, first_msg, kb = self.start_tournament(chat_id, tid)
 
             m: Message = await bot.send_message(
                 chat_id,
@@ -365,35 +737,35 @@ class TournamentManager:
 
         champ = winners[0]
         w = data["round_wins"].get(0, {})
-        if w:
-            if w[0] == 1:
-                runner = 2
-            elif w[1] == 1:
-                runner = 1
-            else:
-                runner = None
+        p, q = data["pairs"][0]
+        if w and w.get(p, 0) != w.get(q, 0):
+            runner = p if w[p] < w[q] else q
         else:
-            logger.warning("Не удалось определить второе место: отсутствуют данные о раунде.")
+            logger.warning("Не удалось определить второе место: финал не был сыгран.")
             runner = None
-        if w:
-            p, q = data["pairs"][0]
-            runner = p if w.get(p, 0) < w.get(q, 0) else q
-        thirds = data["semifinal_losers"]
+        thirds = data["semifinal_losers"][:2]
+        prizes = self._payout(chat_id, tid, champ, runner, thirds, data["all_players"])
+        self.pending_titles.append((chat_id, champ))
+
+        def fmt(name):
+            pts = prizes.get(name)
+            return self._format_username(name) + (f" (+{pts})" if pts else "")
 
-        text = f"🏆 Победитель: {self._format_username(champ)}\n"
+        text = f"🏆 Турнир #{tid}. Победитель: {fmt(champ)}\n"
         if runner:
-            text += f"🥈 Второе: {self._format_username(runner)}\n"
-        if len(thirds) >= 2:
-            text += (f"🥉 Третьи: {self._format_username(thirds[0])}, "
-                     f"{self._format_username(thirds[1])}\n")
+            text += f"🥈 Второе: {fmt(runner)}\n"
+        if thirds:
+            text += f"🥉 Третьи: {', '.join(fmt(name) for name in thirds)}\n"
         await bot.send_message(chat_id, text)
         data["stage"] = "finished"
+        self._finish(chat_id, tid)
 
     # ───────── бросок кубика ─────────
     async def roll_dice(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         chat_id = update.effective_chat.id
         name = update.effective_user.username or update.effective_user.full_name
-        data = self.chats.get(chat_id, {})
+        tid = self.player_index.get((chat_id, name))
+        data = self._get(chat_id, tid) or {}
 
         if data.get("stage") != "round":
             return "❗ Турнир ещё не идёт."
@@ -416,6 +788,7 @@ class TournamentManager:
 
         val = random.randint(1, 6)
         rolls[name] = val
+        self._reset_pair_timer(chat_id, tid, idx, self.ROLL_TIMEOUT)
         await context.bot.send_message(chat_id, f"{self._format_username(name)} бросил 🎲 {val}.")
 
         if len(rolls) < 2:
@@ -423,6 +796,7 @@ class TournamentManager:
             return f"Ход {self._format_username(nxt)}."
         else:
             r1, r2 = rolls[a], rolls[b]
+            data["match_rolls"].setdefault(idx, []).append((r1, r2))
             if r1 == r2:
                 data["round_rolls"][idx] = {}
                 return (
@@ -440,10 +814,11 @@ class TournamentManager:
                 )
                 data["next_round"].append(winner)
                 data["finished_pairs"].add(idx)
+                self._record_match(chat_id, tid, idx, winner)
                 jt = data["pair_timers"].pop(idx, None)
                 if jt:
                     jt.schedule_removal()
-                await self._proceed_next(chat_id, context.bot)
+                await self._proceed_next(chat_id, tid, context.bot)
                 return ""
             else:
                 data["turn_order"][idx] = (first, second)